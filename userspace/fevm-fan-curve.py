@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 import argparse
+import errno
 import glob
 import logging
+import math
 import os
+import select
 import signal
+import threading
 import time
-from typing import Dict, List, Sequence, Tuple
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 
 try:
     import tomllib as toml_reader  # Python 3.11+
@@ -15,7 +22,9 @@ except ModuleNotFoundError:
     except ModuleNotFoundError:
         toml_reader = None
 
-Curve = List[Tuple[float, int]]
+# Flat array("d", [t0, d0, t1, d1, ...]); temperatures strictly increasing,
+# duties integral.
+Curve = array
 
 DEFAULT_CONFIG: Dict[str, object] = {
     "fan1_path": "/sys/devices/platform/fevm-ip3-wmi/fan1_duty",  # CPU fan
@@ -24,59 +33,171 @@ DEFAULT_CONFIG: Dict[str, object] = {
     "min_duty": 20,
     "max_duty": 100,
     "failsafe_duty": 70,
+    "hysteresis": 1,
     "cpu_sensor_names": ["k10temp"],
     "mem_sensor_names": ["spd5118"],
+    "cpu_sensor_devices": [],
+    "mem_sensor_devices": [],
     "mem_fallback_to_cpu": True,
+    "avg_window": 5,
     "cpu_curve": [(40, 20), (55, 35), (65, 55), (75, 75), (85, 100)],
     "mem_curve": [(35, 20), (50, 40), (60, 60), (70, 80), (80, 100)],
+    "cpu_pid": None,
+    "mem_pid": None,
 }
 
-RUNNING = True
+log = logging.getLogger("fevm")
 
+HWMON_ROOT = "/sys/class/hwmon"
 
-def _sigterm_handler(signum, frame):
+# Pre-encoded fan*_duty payloads, indexed by duty percent.
+DUTY_BYTES = tuple(str(i).encode() + b"\n" for i in range(101))
+
+# errno values a held sysfs fd returns once its device has gone away.
+STALE_ERRNOS = (errno.ENODEV, errno.ENOENT)
+
+# While the loop keeps failing, re-assert the failsafe duty only every N ticks
+# instead of hammering the EC with identical writes.
+FAILSAFE_REWRITE_TICKS = 30
+
+STOP_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+# Settings that are bound to open fds / resolved sensors; changing them needs a restart.
+RESTART_KEYS = (
+    "fan1_path",
+    "fan2_path",
+    "cpu_sensor_names",
+    "mem_sensor_names",
+    "cpu_sensor_devices",
+    "mem_sensor_devices",
+    "mem_fallback_to_cpu",
+)
+
+PID_KEYS = ("kp", "ki", "kd", "setpoint")
+
+# path -> (st_mtime_ns or None if absent, parsed config)
+_CONFIG_CACHE: Dict[str, Tuple[Optional[int], Dict[str, object]]] = {}
+
+# Set by the main loop (or any thread) and checked between ticks. Signal
+# handlers must not touch them: Event.set()/clear() take a non-reentrant lock
+# that a handler could interrupt in the same thread.
+STOP = threading.Event()
+RELOAD = threading.Event()
+
+
+def _wakeup_handler(signum, frame):
+    # The C-level handler already wrote signum to the wakeup fd and
+    # wait_for_tick() acts on it; Python only does that while a handler is
+    # installed, so this one must stay a no-op.
     del signum, frame
-    global RUNNING
-    RUNNING = False
+
+
+def install_signal_wakeup() -> int:
+    rfd, wfd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+    signal.set_wakeup_fd(wfd, warn_on_full_buffer=False)
+    for sig in STOP_SIGNALS + (signal.SIGHUP,):
+        signal.signal(sig, _wakeup_handler)
+    return rfd
+
+
+def make_tick_timer(poll_sec: float) -> Optional[int]:
+    if not hasattr(os, "timerfd_create"):  # Python < 3.13
+        return None
+    fd = os.timerfd_create(time.CLOCK_MONOTONIC, flags=os.TFD_NONBLOCK | os.TFD_CLOEXEC)
+    os.timerfd_settime(fd, initial=poll_sec, interval=poll_sec)
+    return fd
+
+
+def wait_for_tick(ep: select.epoll, wakeup_fd: int, timer_fd: Optional[int], deadline: float):
+    """Block until the next tick is due or STOP is set."""
+    while not STOP.is_set():
+        timeout = -1 if timer_fd is not None else max(0.0, deadline - time.monotonic())
+        for fd, _ in ep.poll(timeout):
+            if fd == wakeup_fd:
+                for sig in os.read(wakeup_fd, 64):
+                    if sig in STOP_SIGNALS:
+                        STOP.set()
+                    elif sig == signal.SIGHUP:
+                        RELOAD.set()
+            elif fd == timer_fd:
+                os.read(timer_fd, 8)
+                return
+        if timer_fd is None and time.monotonic() >= deadline:
+            return
 
 
 def parse_curve(raw: Sequence[Sequence[object]], key: str) -> Curve:
-    points: Curve = []
+    curve = array("d")
     for idx, point in enumerate(raw):
-        if not isinstance(point, (list, tuple)) or len(point) != 2:
+        try:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise ValueError
+            temp_c, duty = float(point[0]), float(point[1])
+        except (TypeError, ValueError):
+            raise ValueError(f"{key}[{idx}] must be [temp_c, duty]") from None
+        if math.isnan(temp_c) or not math.isfinite(duty):
             raise ValueError(f"{key}[{idx}] must be [temp_c, duty]")
-        temp_c = float(point[0])
-        duty = int(point[1])
-        points.append((temp_c, duty))
+        curve.append(temp_c)
+        curve.append(math.trunc(duty))
 
-    if not points:
+    if not curve:
         raise ValueError(f"{key} must not be empty")
 
-    prev_t = None
-    for temp_c, _ in points:
-        if prev_t is not None and temp_c <= prev_t:
-            raise ValueError(f"{key} temperatures must be strictly increasing")
-        prev_t = temp_c
-
-    return points
+    temps = curve[::2]
+    if any(not t1 > t0 for t0, t1 in zip(temps, temps[1:])):
+        raise ValueError(f"{key} temperatures must be strictly increasing")
+
+    return curve
+
+
+def parse_pid(raw: Dict[str, object], key: str) -> Dict[str, float]:
+    if not isinstance(raw, dict):
+        raise ValueError(f"{key} must be a table")
+    # A typo such as Kp would otherwise leave that gain at 0 and pin the fan
+    # at min_duty whatever the temperature.
+    unknown = sorted(set(raw) - set(PID_KEYS))
+    if unknown:
+        raise ValueError(f"{key} has unknown keys {unknown}, expected {list(PID_KEYS)}")
+    if "setpoint" not in raw:
+        raise ValueError(f"{key}.setpoint is required")
+    pid = {k: float(raw.get(k, 0.0)) for k in PID_KEYS}
+    for k, v in pid.items():
+        if not math.isfinite(v):
+            raise ValueError(f"{key}.{k} must be a finite number")
+    if min(pid["kp"], pid["ki"], pid["kd"]) < 0:
+        raise ValueError(f"{key} gains must be >= 0")
+    if pid["kp"] == 0 and pid["ki"] == 0:
+        raise ValueError(f"{key} needs a non-zero kp or ki")
+    return pid
 
 
 def load_config(path: str) -> Dict[str, object]:
+    """Parse path, reusing the previous result while its mtime is unchanged."""
+    try:
+        mtime: Optional[int] = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    cached = _CONFIG_CACHE.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    cfg = read_config(path)
+    _CONFIG_CACHE[path] = (mtime, cfg)
+    return cfg
+
+
+def read_config(path: str) -> Dict[str, object]:
     cfg = {
-        "fan1_path": str(DEFAULT_CONFIG["fan1_path"]),
-        "fan2_path": str(DEFAULT_CONFIG["fan2_path"]),
-        "poll_sec": float(DEFAULT_CONFIG["poll_sec"]),
-        "min_duty": int(DEFAULT_CONFIG["min_duty"]),
-        "max_duty": int(DEFAULT_CONFIG["max_duty"]),
-        "failsafe_duty": int(DEFAULT_CONFIG["failsafe_duty"]),
+        **DEFAULT_CONFIG,
+        # DEFAULT_CONFIG is already well-typed; only copy what callers could mutate.
         "cpu_sensor_names": list(DEFAULT_CONFIG["cpu_sensor_names"]),
         "mem_sensor_names": list(DEFAULT_CONFIG["mem_sensor_names"]),
-        "mem_fallback_to_cpu": bool(DEFAULT_CONFIG["mem_fallback_to_cpu"]),
-        "cpu_curve": list(DEFAULT_CONFIG["cpu_curve"]),
-        "mem_curve": list(DEFAULT_CONFIG["mem_curve"]),
+        "cpu_sensor_devices": list(DEFAULT_CONFIG["cpu_sensor_devices"]),
+        "mem_sensor_devices": list(DEFAULT_CONFIG["mem_sensor_devices"]),
     }
 
     if not os.path.exists(path):
+        cfg["cpu_curve"] = parse_curve(cfg["cpu_curve"], "curves.cpu")
+        cfg["mem_curve"] = parse_curve(cfg["mem_curve"], "curves.mem")
         return cfg
 
     if toml_reader is None:
@@ -88,98 +209,349 @@ def load_config(path: str) -> Dict[str, object]:
     general = data.get("general", {})
     sensors = data.get("sensors", {})
     curves = data.get("curves", {})
+    pid = data.get("pid", {})
 
-    if "fan1_path" in general:
-        cfg["fan1_path"] = str(general["fan1_path"])
-    if "fan2_path" in general:
-        cfg["fan2_path"] = str(general["fan2_path"])
-    if "poll_sec" in general:
-        cfg["poll_sec"] = float(general["poll_sec"])
-    if "min_duty" in general:
-        cfg["min_duty"] = int(general["min_duty"])
-    if "max_duty" in general:
-        cfg["max_duty"] = int(general["max_duty"])
-    if "failsafe_duty" in general:
-        cfg["failsafe_duty"] = int(general["failsafe_duty"])
+    for key in ("fan1_path", "fan2_path", "poll_sec", "min_duty", "max_duty", "failsafe_duty", "hysteresis"):
+        if key in general:
+            cfg[key] = general[key]
 
     if "cpu_names" in sensors:
-        cfg["cpu_sensor_names"] = [str(x) for x in sensors["cpu_names"]]
+        cfg["cpu_sensor_names"] = sensors["cpu_names"]
     if "mem_names" in sensors:
-        cfg["mem_sensor_names"] = [str(x) for x in sensors["mem_names"]]
+        cfg["mem_sensor_names"] = sensors["mem_names"]
+    if "cpu_devices" in sensors:
+        cfg["cpu_sensor_devices"] = sensors["cpu_devices"]
+    if "mem_devices" in sensors:
+        cfg["mem_sensor_devices"] = sensors["mem_devices"]
     if "mem_fallback_to_cpu" in sensors:
-        cfg["mem_fallback_to_cpu"] = bool(sensors["mem_fallback_to_cpu"])
+        cfg["mem_fallback_to_cpu"] = sensors["mem_fallback_to_cpu"]
+    if "avg_window" in sensors:
+        cfg["avg_window"] = sensors["avg_window"]
 
     if "cpu" in curves:
-        cfg["cpu_curve"] = parse_curve(curves["cpu"], "curves.cpu")
+        cfg["cpu_curve"] = curves["cpu"]
     if "mem" in curves:
-        cfg["mem_curve"] = parse_curve(curves["mem"], "curves.mem")
+        cfg["mem_curve"] = curves["mem"]
+
+    if "cpu" in pid:
+        cfg["cpu_pid"] = pid["cpu"]
+    if "mem" in pid:
+        cfg["mem_pid"] = pid["mem"]
+
+    return validate_config(cfg)
+
+
+def validate_config(cfg: Dict[str, object]) -> Dict[str, object]:
+    """Coerce and check every field in one pass, after user overrides are merged."""
+    cfg["fan1_path"] = str(cfg["fan1_path"])
+    cfg["fan2_path"] = str(cfg["fan2_path"])
+    cfg["poll_sec"] = float(cfg["poll_sec"])
+    for key in ("min_duty", "max_duty", "failsafe_duty", "hysteresis", "avg_window"):
+        cfg[key] = int(cfg[key])
+    for key in ("cpu_sensor_names", "mem_sensor_names", "cpu_sensor_devices", "mem_sensor_devices"):
+        cfg[key] = [str(x) for x in cfg[key]]
+    cfg["mem_fallback_to_cpu"] = bool(cfg["mem_fallback_to_cpu"])
+
+    cfg["cpu_curve"] = parse_curve(cfg["cpu_curve"], "curves.cpu")
+    cfg["mem_curve"] = parse_curve(cfg["mem_curve"], "curves.mem")
+    if cfg["cpu_pid"] is not None:
+        cfg["cpu_pid"] = parse_pid(cfg["cpu_pid"], "pid.cpu")
+    if cfg["mem_pid"] is not None:
+        cfg["mem_pid"] = parse_pid(cfg["mem_pid"], "pid.mem")
+
+    if not 0 < cfg["poll_sec"] < math.inf:
+        # Also rejects nan/inf, which the timerfd and deadline math cannot take.
+        raise ValueError("general.poll_sec must be a finite number > 0")
+    if cfg["avg_window"] < 1:
+        raise ValueError("sensors.avg_window must be >= 1")
+    if not 0 <= cfg["min_duty"] <= cfg["max_duty"] <= 100:
+        raise ValueError("general.min_duty/max_duty must satisfy 0 <= min_duty <= max_duty <= 100")
 
     return cfg
 
 
-def find_hwmons_by_name(name: str) -> List[str]:
+def find_hwmons_by_name(name: str) -> List[Tuple[str, str]]:
+    """Return (hwmon path, device basename) for every hwmon chip called name.
+
+    The device basename (e.g. "1-0050", "0000:00:18.3") tells apart chips
+    that share a name, such as one spd5118/jc42 per DIMM.
+    """
+    target = name.encode()
     found = []
-    for p in glob.glob("/sys/class/hwmon/hwmon*"):
+    try:
+        with os.scandir(HWMON_ROOT) as it:
+            entries = sorted(it, key=lambda e: e.name)
+    except FileNotFoundError:
+        return found  # no hwmon class at all (container, hwmon not built)
+    for entry in entries:
+        if not entry.name.startswith("hwmon"):
+            continue
+        # A chip that is mid-unbind can fail the open or the read with ENODEV;
+        # skip it like one that is already gone.
         try:
-            with open(os.path.join(p, "name"), "r", encoding="utf-8") as f:
-                if f.read().strip() == name:
-                    found.append(p)
-        except FileNotFoundError:
+            fd = os.open(entry.path + "/name", os.O_RDONLY)
+        except OSError:
             continue
+        try:
+            chip = os.read(fd, 64).strip()
+        except OSError:
+            continue
+        finally:
+            os.close(fd)
+        # hwmon names are short ASCII; compare raw bytes, no text decoding.
+        if chip != target:
+            continue
+        try:
+            device = os.path.basename(os.readlink(entry.path + "/device"))
+        except OSError:
+            device = ""  # virtual hwmon without a backing device
+        found.append((entry.path, device))
     return found
 
 
-def resolve_hwmons(names: Sequence[str]) -> List[str]:
+def resolve_hwmons(names: Sequence[str], devices: Sequence[str] = ()) -> List[str]:
     dedup = []
     seen = set()
     for name in names:
-        for hwmon in find_hwmons_by_name(name):
+        for hwmon, device in find_hwmons_by_name(name):
+            if devices and device not in devices:
+                continue
             if hwmon not in seen:
                 dedup.append(hwmon)
                 seen.add(hwmon)
     return dedup
 
 
-def read_temp_millic(path: str) -> float:
-    with open(path, "r", encoding="utf-8") as f:
-        return int(f.read().strip()) / 1000.0
+def resolve_sensor_hwmons(cfg: Dict[str, object], level: int = logging.WARNING) -> Tuple[List[str], List[str]]:
+    cpu_hwmons = resolve_hwmons(cfg["cpu_sensor_names"], cfg["cpu_sensor_devices"])
+    mem_hwmons = resolve_hwmons(cfg["mem_sensor_names"], cfg["mem_sensor_devices"])
+    if not mem_hwmons and cpu_hwmons and bool(cfg["mem_fallback_to_cpu"]):
+        mem_hwmons = cpu_hwmons
+        log.log(level, "memory hwmon not found, fallback to CPU sensor")
+    return cpu_hwmons, mem_hwmons
 
 
-def max_temp_in_hwmons(hwmon_paths: Sequence[str]) -> float:
-    temps = []
+def open_temp_inputs(paths: Sequence[str]) -> List[int]:
+    fds = []
+    for p in paths:
+        try:
+            fds.append(os.open(p, os.O_RDONLY))
+        except FileNotFoundError:
+            continue
+    return fds
+
+
+def close_fds(fds: Sequence[int]):
+    for fd in fds:
+        try:
+            os.close(fd)
+        except OSError:
+            continue
+
+
+def read_temp_millic(fd: int) -> float:
+    # sysfs regenerates the attribute on every read from offset 0; pread does
+    # the seek and the read in one syscall.
+    return int(os.pread(fd, 32, 0).strip()) / 1000.0
+
+
+def resolve_temp_inputs(hwmon_paths: Sequence[str]) -> List[str]:
+    paths = []
     for hwmon in hwmon_paths:
-        for t in glob.glob(os.path.join(hwmon, "temp*_input")):
-            try:
-                temps.append(read_temp_millic(t))
-            except Exception:
-                continue
-    if not temps:
-        raise RuntimeError(f"no temp*_input found under {hwmon_paths}")
-    return max(temps)
+        paths.extend(sorted(glob.glob(os.path.join(hwmon, "temp*_input"))))
+    return paths
 
 
-def lerp_curve(temp_c: float, curve: Curve) -> int:
-    if temp_c <= curve[0][0]:
-        return curve[0][1]
-    if temp_c >= curve[-1][0]:
-        return curve[-1][1]
+def drop_stale_fds(fds: Sequence[int]) -> List[int]:
+    """Close and drop inputs that still fail with ENODEV/ENOENT after a reopen."""
+    live = []
+    for fd in fds:
+        try:
+            os.pread(fd, 32, 0)
+        except OSError as e:
+            if e.errno in STALE_ERRNOS:
+                close_fds([fd])
+                continue
+        live.append(fd)
+    return live
 
-    for (t0, d0), (t1, d1) in zip(curve, curve[1:]):
-        if t0 <= temp_c <= t1:
-            ratio = (temp_c - t0) / (t1 - t0)
-            return int(round(d0 + ratio * (d1 - d0)))
 
-    return curve[-1][1]
+def max_temp(fds: Sequence[int]) -> float:
+    if not fds:
+        # Every input was dropped or the hwmon is gone; keep re-resolving.
+        raise FileNotFoundError("no temp*_input open")
+    hottest = None
+    missing = False
+    for fd in fds:
+        try:
+            t = read_temp_millic(fd)
+        except OSError as e:
+            if e.errno in STALE_ERRNOS:
+                missing = True
+            continue
+        except ValueError:
+            continue
+        if hottest is None or t > hottest:
+            hottest = t
+    if missing:
+        # A sensor disappeared (hotplug/driver rebind); let the caller re-resolve.
+        raise FileNotFoundError(f"temp input vanished, fds={list(fds)}")
+    if hottest is None:
+        raise RuntimeError(f"no readable temp*_input, fds={list(fds)}")
+    return hottest
 
 
 def clamp_duty(duty: int, min_duty: int, max_duty: int) -> int:
-    return max(min_duty, min(max_duty, duty))
+    return duty if min_duty <= duty <= max_duty else (min_duty if duty < min_duty else max_duty)
+
+
+def compile_curve(curve: Curve, min_duty: int, max_duty: int) -> Callable[[float], int]:
+    """Return f(temp_c) -> clamped duty, specialized for this curve and these limits.
+
+    The curve is partially evaluated into a chain of comparisons against
+    literal breakpoints. Between points the duty is interpolated linearly and
+    rounded; outside the curve the end duties hold.
+    """
+
+    def segment(expr: str, lo: int, hi: int) -> List[str]:
+        if min_duty <= lo and hi <= max_duty:
+            return [f"return {expr}"]
+        return [f"d = {expr}", f"return {min_duty} if d < {min_duty} else ({max_duty} if d > {max_duty} else d)"]
+
+    temps = curve[::2]
+    duties = [int(d) for d in curve[1::2]]
+    lines = ["def curve(t):", f"    if t < {temps[0]!r}:", f"        return {clamp_duty(duties[0], min_duty, max_duty)}"]
+    for i in range(1, len(temps)):
+        t0, t1, d0, d1 = temps[i - 1], temps[i], duties[i - 1], duties[i]
+        expr = f"int(round({d0} + (t - {t0!r}) / {t1 - t0!r} * {d1 - d0}))"
+        lines.append(f"    if t < {t1!r}:")
+        lines.extend("        " + line for line in segment(expr, min(d0, d1), max(d0, d1)))
+    lines.append(f"    return {clamp_duty(duties[-1], min_duty, max_duty)}")
+
+    namespace: Dict[str, object] = {"inf": math.inf}
+    exec("\n".join(lines), namespace)
+    return namespace["curve"]
+
+
+@dataclass
+class PIDController:
+    kp: float
+    ki: float
+    kd: float
+    setpoint: float
+    integral: float = 0.0
+    last_err: float = 0.0
+    last_t: Optional[float] = None
+
+    def update(self, temp_c: float, now: float, min_duty: int, max_duty: int) -> int:
+        err = temp_c - self.setpoint
+        dt = 0.0 if self.last_t is None else now - self.last_t
+        integral = self.integral + err * dt
+        deriv = (err - self.last_err) / dt if dt > 0 else 0.0
+        u = self.kp * err + self.ki * integral + self.kd * deriv
+
+        # Anti-windup: freeze the integral while the output is pinned at a limit
+        # and the error would push it further past that limit.
+        if not ((u >= max_duty and err > 0) or (u <= min_duty and err < 0)):
+            self.integral = integral
+        self.last_err = err
+        self.last_t = now
+        return clamp_duty(int(round(u)), min_duty, max_duty)
+
+
+@dataclass
+class Settings:
+    """Control-loop parameters; swapped wholesale on SIGHUP reload."""
+
+    poll_sec: float
+    min_duty: int
+    max_duty: int
+    failsafe_duty: int
+    hysteresis: int
+    avg_window: int
+    cpu_curve: Callable[[float], int]
+    mem_curve: Callable[[float], int]
+    cpu_pid: Optional[PIDController]
+    mem_pid: Optional[PIDController]
+
+
+def build_settings(cfg: Dict[str, object]) -> Settings:
+    min_duty = int(cfg["min_duty"])
+    max_duty = int(cfg["max_duty"])
+    return Settings(
+        poll_sec=float(cfg["poll_sec"]),
+        min_duty=min_duty,
+        max_duty=max_duty,
+        failsafe_duty=int(cfg["failsafe_duty"]),
+        hysteresis=int(cfg["hysteresis"]),
+        avg_window=int(cfg["avg_window"]),
+        cpu_curve=compile_curve(cfg["cpu_curve"], min_duty, max_duty),
+        mem_curve=compile_curve(cfg["mem_curve"], min_duty, max_duty),
+        cpu_pid=PIDController(**cfg["cpu_pid"]) if cfg["cpu_pid"] else None,
+        mem_pid=PIDController(**cfg["mem_pid"]) if cfg["mem_pid"] else None,
+    )
 
 
-def write_duty(path: str, duty: int, min_duty: int, max_duty: int):
-    duty = clamp_duty(duty, min_duty, max_duty)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(str(duty))
+def reload_config(
+    path: str, cfg: Dict[str, object], startup_cfg: Dict[str, object]
+) -> Optional[Dict[str, object]]:
+    """Return the new config if path changed and parses, otherwise None.
+
+    RESTART_KEYS are compared with startup_cfg, the values the daemon is
+    actually running with, not with the last reloaded config.
+    """
+    try:
+        new_cfg = load_config(path)
+    except Exception:
+        log.exception("config reload failed, keeping current settings")
+        return None
+    if new_cfg is cfg:
+        log.info("config %s unchanged, nothing to reload", path)
+        return None
+    stale = [k for k in RESTART_KEYS if new_cfg[k] != startup_cfg[k]]
+    if stale:
+        log.warning("config keys %s only take effect after a restart", stale)
+    return new_cfg
+
+
+def duty_needs_write(duty: int, last: Optional[int], hysteresis: int, min_duty: int, max_duty: int) -> bool:
+    if last is None:
+        return True
+    if duty == last:
+        return False
+    # Always let the curve reach its end stops, otherwise 99 -> 100 would be held off.
+    if duty in (min_duty, max_duty):
+        return True
+    return abs(duty - last) > hysteresis
+
+
+def open_fan_nodes(fan1_path: str, fan2_path: str) -> Tuple[int, int]:
+    try:
+        fan1_fd = os.open(fan1_path, os.O_WRONLY)
+    except OSError as e:
+        raise SystemExit(f"cannot open fan duty node: {e}")
+    try:
+        fan2_fd = os.open(fan2_path, os.O_WRONLY)
+    except OSError as e:
+        close_fds([fan1_fd])
+        raise SystemExit(f"cannot open fan duty node: {e}")
+    return fan1_fd, fan2_fd
+
+
+def reopen_fan_nodes(fan_fds: Sequence[int], fan1_path: str, fan2_path: str) -> Tuple[int, int]:
+    # The fan driver was rebound and the fds point at the old nodes. If they
+    # cannot be reopened, exit and let systemd restart us rather than run
+    # with no fan control.
+    close_fds(fan_fds)
+    return open_fan_nodes(fan1_path, fan2_path)
+
+
+def write_duty(fd: int, duty: int, min_duty: int, max_duty: int) -> int:
+    """Write duty clamped to [min_duty, max_duty] and return the value written."""
+    if not min_duty <= duty <= max_duty:
+        duty = min_duty if duty < min_duty else max_duty
+    os.pwrite(fd, DUTY_BYTES[duty], 0)
+    return duty
 
 
 def main() -> int:
@@ -188,70 +560,194 @@ def main() -> int:
     parser.add_argument("--log-level", default="INFO", help="DEBUG/INFO/WARNING/ERROR")
     args = parser.parse_args()
 
-    logging.basicConfig(
-        level=getattr(logging, args.log_level.upper(), logging.INFO),
-        format="%(asctime)s %(levelname)s %(message)s",
-    )
+    if os.environ.get("JOURNAL_STREAM"):
+        # Running under systemd: journald already stamps every line.
+        logging.basicConfig(format="%(levelname)s %(message)s")
+    else:
+        logging.basicConfig(format="%(asctime)s.%(msecs)03d %(levelname)s %(message)s", datefmt="%H:%M:%S")
+    # Only our logger follows --log-level; the root logger stays at WARNING so
+    # third-party DEBUG output stays out of the log.
+    log.setLevel(getattr(logging, args.log_level.upper(), logging.INFO))
 
-    signal.signal(signal.SIGTERM, _sigterm_handler)
-    signal.signal(signal.SIGINT, _sigterm_handler)
+    wakeup_fd = install_signal_wakeup()
 
     cfg = load_config(args.config)
+    # RESTART_KEYS stay bound to these values until restart: the fan paths and
+    # the sensor lookup used by every re-resolve.
+    startup_cfg = cfg
 
     fan1_path = str(cfg["fan1_path"])
     fan2_path = str(cfg["fan2_path"])
-    poll_sec = float(cfg["poll_sec"])
-    min_duty = int(cfg["min_duty"])
-    max_duty = int(cfg["max_duty"])
-    failsafe_duty = int(cfg["failsafe_duty"])
-    cpu_curve: Curve = list(cfg["cpu_curve"])
-    mem_curve: Curve = list(cfg["mem_curve"])
+    st = build_settings(cfg)
 
-    cpu_hwmons = resolve_hwmons(cfg["cpu_sensor_names"])
-    mem_hwmons = resolve_hwmons(cfg["mem_sensor_names"])
+    cpu_hwmons, mem_hwmons = resolve_sensor_hwmons(startup_cfg)
 
     if not cpu_hwmons:
-        raise SystemExit(f"CPU hwmon not found, names={cfg['cpu_sensor_names']}")
+        raise SystemExit(
+            f"CPU hwmon not found, names={cfg['cpu_sensor_names']} devices={cfg['cpu_sensor_devices']}"
+        )
 
     if not mem_hwmons:
-        if bool(cfg["mem_fallback_to_cpu"]):
-            mem_hwmons = cpu_hwmons
-            logging.warning("memory hwmon not found, fallback to CPU sensor")
-        else:
-            raise SystemExit(f"MEM hwmon not found, names={cfg['mem_sensor_names']}")
+        raise SystemExit(
+            f"MEM hwmon not found, names={cfg['mem_sensor_names']} devices={cfg['mem_sensor_devices']}"
+        )
 
-    logging.info("cpu_hwmons=%s mem_hwmons=%s", cpu_hwmons, mem_hwmons)
-    logging.info("fan1=%s fan2=%s poll=%.2fs", fan1_path, fan2_path, poll_sec)
+    fan1_fd, fan2_fd = open_fan_nodes(fan1_path, fan2_path)
 
-    while RUNNING:
-        try:
-            cpu_t = max_temp_in_hwmons(cpu_hwmons)
-            mem_t = max_temp_in_hwmons(mem_hwmons)
-
-            cpu_duty = lerp_curve(cpu_t, cpu_curve)
-            mem_duty = lerp_curve(mem_t, mem_curve)
-
-            write_duty(fan1_path, cpu_duty, min_duty, max_duty)
-            write_duty(fan2_path, mem_duty, min_duty, max_duty)
-
-            logging.debug(
-                "cpu=%.1fC mem=%.1fC -> fan1=%d fan2=%d",
-                cpu_t,
-                mem_t,
-                clamp_duty(cpu_duty, min_duty, max_duty),
-                clamp_duty(mem_duty, min_duty, max_duty),
-            )
-        except Exception as e:
-            logging.exception("fan loop error: %s; applying failsafe duty", e)
-            try:
-                write_duty(fan1_path, failsafe_duty, min_duty, max_duty)
-                write_duty(fan2_path, failsafe_duty, min_duty, max_duty)
-            except Exception:
-                logging.exception("failed to write failsafe duty")
+    cpu_temp_fds = open_temp_inputs(resolve_temp_inputs(cpu_hwmons))
+    mem_temp_fds = open_temp_inputs(resolve_temp_inputs(mem_hwmons))
+
+    log.info("cpu_hwmons=%s mem_hwmons=%s", cpu_hwmons, mem_hwmons)
+    log.info("fan1=%s fan2=%s poll=%.2fs", fan1_path, fan2_path, st.poll_sec)
+    log.info(
+        "cpu_control=%s mem_control=%s", "pid" if st.cpu_pid else "curve", "pid" if st.mem_pid else "curve"
+    )
+
+    last_cpu_duty: Optional[int] = None
+    last_mem_duty: Optional[int] = None
+    consecutive_errors = 0
+    failsafe_errors = 0
 
-        time.sleep(poll_sec)
+    # Moving average over the last avg_window readings; 1C-quantized sensors
+    # otherwise step the curve and kick the PID derivative term.
+    cpu_ring: deque = deque(maxlen=st.avg_window)
+    mem_ring: deque = deque(maxlen=st.avg_window)
 
-    logging.info("shutdown requested, exit")
+    ep = select.epoll()
+    ep.register(wakeup_fd, select.EPOLLIN)
+    timer_fd = make_tick_timer(st.poll_sec)
+    if timer_fd is not None:
+        ep.register(timer_fd, select.EPOLLIN)
+    deadline = time.monotonic()
+
+    try:
+        while not STOP.is_set():
+            if RELOAD.is_set():
+                RELOAD.clear()
+                new_cfg = reload_config(args.config, cfg, startup_cfg)
+                if new_cfg is not None:
+                    try:
+                        new_st = build_settings(new_cfg)
+                    except Exception:
+                        log.exception("invalid config on reload, keeping current settings")
+                    else:
+                        # An unchanged PID table keeps its controller, so the
+                        # integral survives the reload instead of stepping the duty.
+                        if new_cfg["cpu_pid"] == cfg["cpu_pid"]:
+                            new_st.cpu_pid = st.cpu_pid
+                        if new_cfg["mem_pid"] == cfg["mem_pid"]:
+                            new_st.mem_pid = st.mem_pid
+                        cfg, st = new_cfg, new_st
+                        cpu_ring = deque(cpu_ring, maxlen=st.avg_window)
+                        mem_ring = deque(mem_ring, maxlen=st.avg_window)
+                        # New limits may reshape the output; push it on this tick.
+                        last_cpu_duty = last_mem_duty = None
+                        if timer_fd is not None:
+                            os.timerfd_settime(timer_fd, initial=st.poll_sec, interval=st.poll_sec)
+                        log.info("config reloaded from %s", args.config)
+
+            try:
+                try:
+                    cpu_raw = max_temp(cpu_temp_fds)
+                    mem_raw = max_temp(mem_temp_fds)
+                except FileNotFoundError:
+                    # Stay quiet while the sensor is still gone; the failsafe path logs.
+                    level = logging.DEBUG if consecutive_errors else logging.WARNING
+                    log.log(level, "temp input missing, re-resolving hwmon sensors")
+                    close_fds(cpu_temp_fds + mem_temp_fds)
+                    # Never keep closed fd numbers: if the re-resolve below fails,
+                    # the empty lists make the next tick try again.
+                    cpu_temp_fds = mem_temp_fds = []
+                    # A rebound driver comes back as a new hwmonN; the old paths are gone.
+                    cpu_hwmons, mem_hwmons = resolve_sensor_hwmons(startup_cfg, level)
+                    log.log(level, "cpu_hwmons=%s mem_hwmons=%s", cpu_hwmons, mem_hwmons)
+                    # An input that is dead even after reopening would otherwise
+                    # fail every tick; run on the remaining ones instead.
+                    cpu_temp_fds = drop_stale_fds(open_temp_inputs(resolve_temp_inputs(cpu_hwmons)))
+                    mem_temp_fds = drop_stale_fds(open_temp_inputs(resolve_temp_inputs(mem_hwmons)))
+                    cpu_raw = max_temp(cpu_temp_fds)
+                    mem_raw = max_temp(mem_temp_fds)
+
+                cpu_ring.append(cpu_raw)
+                mem_ring.append(mem_raw)
+                cpu_t = math.fsum(cpu_ring) / len(cpu_ring)
+                mem_t = math.fsum(mem_ring) / len(mem_ring)
+
+                now = time.monotonic()
+                if st.cpu_pid is not None:
+                    cpu_duty = st.cpu_pid.update(cpu_t, now, st.min_duty, st.max_duty)
+                else:
+                    cpu_duty = st.cpu_curve(cpu_t)
+                if st.mem_pid is not None:
+                    mem_duty = st.mem_pid.update(mem_t, now, st.min_duty, st.max_duty)
+                else:
+                    mem_duty = st.mem_curve(mem_t)
+
+                try:
+                    if duty_needs_write(cpu_duty, last_cpu_duty, st.hysteresis, st.min_duty, st.max_duty):
+                        last_cpu_duty = write_duty(fan1_fd, cpu_duty, st.min_duty, st.max_duty)
+                    if duty_needs_write(mem_duty, last_mem_duty, st.hysteresis, st.min_duty, st.max_duty):
+                        last_mem_duty = write_duty(fan2_fd, mem_duty, st.min_duty, st.max_duty)
+                except OSError as e:
+                    if e.errno in STALE_ERRNOS:
+                        log.warning("fan duty node went away (%s), reopening", e)
+                        fan1_fd, fan2_fd = reopen_fan_nodes([fan1_fd, fan2_fd], fan1_path, fan2_path)
+                        last_cpu_duty = last_mem_duty = None
+                    raise
+
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug(
+                        "cpu=%.1fC mem=%.1fC -> fan1=%d fan2=%d",
+                        cpu_t,
+                        mem_t,
+                        last_cpu_duty,
+                        last_mem_duty,
+                    )
+
+                if consecutive_errors:
+                    log.info("fan loop recovered after %d failed ticks", consecutive_errors)
+                    consecutive_errors = 0
+            except Exception as e:
+                consecutive_errors += 1
+                rewrite = (
+                    consecutive_errors == 1
+                    or consecutive_errors % FAILSAFE_REWRITE_TICKS == 0
+                    or last_cpu_duty is None
+                    or last_mem_duty is None
+                )
+                if consecutive_errors == 1:
+                    log.exception("fan loop error; applying failsafe duty")
+                elif consecutive_errors % FAILSAFE_REWRITE_TICKS == 0:
+                    log.warning("fan loop still failing (%d ticks): %s; re-applying failsafe duty", consecutive_errors, e)
+
+                if rewrite:
+                    # Fan state is unknown until the failsafe write lands.
+                    last_cpu_duty = last_mem_duty = None
+                    try:
+                        last_cpu_duty = write_duty(fan1_fd, st.failsafe_duty, st.min_duty, st.max_duty)
+                        last_mem_duty = write_duty(fan2_fd, st.failsafe_duty, st.min_duty, st.max_duty)
+                    except Exception as fe:
+                        # Retried every tick while the fan state is unknown, but
+                        # only the first failure carries a traceback.
+                        failsafe_errors += 1
+                        if failsafe_errors == 1:
+                            log.exception("failed to write failsafe duty")
+                        elif failsafe_errors % FAILSAFE_REWRITE_TICKS == 0:
+                            log.warning("failsafe duty still not written (%d attempts): %s", failsafe_errors, fe)
+                        if isinstance(fe, OSError) and fe.errno in STALE_ERRNOS:
+                            fan1_fd, fan2_fd = reopen_fan_nodes([fan1_fd, fan2_fd], fan1_path, fan2_path)
+                    else:
+                        failsafe_errors = 0
+
+            deadline = max(deadline + st.poll_sec, time.monotonic())
+            wait_for_tick(ep, wakeup_fd, timer_fd, deadline)
+    finally:
+        ep.close()
+        close_fds(cpu_temp_fds + mem_temp_fds + [fan1_fd, fan2_fd, wakeup_fd])
+        if timer_fd is not None:
+            close_fds([timer_fd])
+
+    log.info("shutdown requested, exit")
     return 0
 
 